@@ -14,9 +14,9 @@ class CreativeAgent:
         """
         Takes a prompt and converts it into a creative_writing action.
         """
-        self.logger.info(f"CreativeAgent is handling prompt: '{prompt}'")
+        self.logger.info("CreativeAgent is handling prompt: '%s'", prompt)
         # In a real system, this might call a different LLM or use a specific template.
         # For our purposes, we just format the action.
         action = {"tool": "creative_writing", "parameters": {"task": prompt}}
-        self.logger.info(f"CreativeAgent proposed action: {action}")
+        self.logger.info("CreativeAgent proposed action: %s", action)
         return action
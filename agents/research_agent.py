@@ -14,7 +14,7 @@ class ResearchAgent:
         """
         Takes a prompt and converts it into a web_search action.
         """
-        self.logger.info(f"ResearchAgent is handling prompt: '{prompt}'")
+        self.logger.info("ResearchAgent is handling prompt: '%s'", prompt)
         action = {"tool": "web_search", "parameters": {"query": prompt}}
-        self.logger.info(f"ResearchAgent proposed action: {action}")
+        self.logger.info("ResearchAgent proposed action: %s", action)
         return action
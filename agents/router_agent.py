@@ -3,10 +3,16 @@
 import logging
 from typing import Dict, Any
 
+from utils.keyword_matcher import KeywordMatcher
+
 # Import the specialized agents
 from .research_agent import ResearchAgent
 from .creative_agent import CreativeAgent
 
+# --- Constants ---
+# Prompts containing any of these keywords are routed to the CreativeAgent.
+CREATIVE_KEYWORDS = ("write", "create", "tell me a", "poem", "joke", "story")
+
 class RouterAgent:
     """
     A router agent that delegates tasks to specialized agents based on the prompt.
@@ -18,6 +24,7 @@ class RouterAgent:
             "research": ResearchAgent(logger),
             "creative": CreativeAgent(logger),
         }
+        self._creative_matcher = KeywordMatcher(CREATIVE_KEYWORDS)
         self.logger.info("RouterAgent initialized with specialized agents.")
 
     def route(self, prompt: str) -> Dict[str, Any]:
@@ -30,14 +37,11 @@ class RouterAgent:
         Returns:
             Dict[str, Any]: The action proposed by the chosen specialized agent.
         """
-        self.logger.info(f"RouterAgent received prompt for routing: '{prompt}'")
-        prompt_lower = prompt.lower()
+        self.logger.info("RouterAgent received prompt for routing: '%s'", prompt)
 
         # Simple keyword-based routing logic
-        creative_keywords = ["write", "create", "tell me a", "poem", "joke", "story"]
-        
         # If any creative keyword is in the prompt, delegate to the CreativeAgent.
-        if any(keyword in prompt_lower for keyword in creative_keywords):
+        if self._creative_matcher.search(prompt):
             self.logger.info("Routing to CreativeAgent.")
             return self.agents["creative"].run(prompt)
         
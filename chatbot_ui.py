@@ -1,11 +1,30 @@
 import streamlit as st
 import requests
-import json
+import orjson
 
 # --- Configuration ---
 # The URL of your running FastAPI backend
 BACKEND_URL = "http://127.0.0.1:8000/invoke"
 
+# --- Helpers ---
+def get_backend_session() -> requests.Session:
+    """
+    A keep-alive session kept across reruns, so each message reuses the backend connection.
+    Each browser session gets its own, since Streamlit serves sessions from separate threads
+    and requests.Session isn't thread-safe.
+    """
+    if "backend_session" not in st.session_state:
+        st.session_state.backend_session = requests.Session()
+    return st.session_state.backend_session
+
+def format_approved_action(agent_used: str, tool: str, parameters: dict) -> str:
+    """Builds the Markdown shown for an approved agent action."""
+    return (
+        f"✅ **Request routed to `{agent_used}` and approved.**\n\n"
+        f"**Proposed Action:** `{tool}`\n"
+        f"```json\n{orjson.dumps(parameters, option=orjson.OPT_INDENT_2).decode()}\n```"
+    )
+
 # --- Streamlit Page Setup ---
 st.set_page_config(page_title="Guardrails Chatbot", page_icon="🛡️")
 
@@ -45,7 +64,7 @@ if st.button("Send", use_container_width=True):
                     "prompt": prompt_input,
                     "image_url": image_url_input if image_url_input else None
                 }
-                response = requests.post(BACKEND_URL, json=payload, timeout=30)
+                response = get_backend_session().post(BACKEND_URL, json=payload, timeout=30)
                 
                 assistant_response_content = "Sorry, I encountered an error."
 
@@ -56,11 +75,9 @@ if st.button("Send", use_container_width=True):
                     # --- MODIFICATION: Display which agent was used ---
                     agent_used = response_data.get("routed_to", "Unknown Agent")
                     
-                    assistant_response_content = f"✅ **Request routed to `{agent_used}` and approved.**\n\n"
-                    assistant_response_content += f"**Proposed Action:** `{action.get('tool')}`\n"
-                    assistant_response_content += "```json\n"
-                    assistant_response_content += json.dumps(action.get('parameters', {}), indent=2)
-                    assistant_response_content += "\n```"
+                    assistant_response_content = format_approved_action(
+                        agent_used, action.get('tool'), action.get('parameters', {})
+                    )
                 else:
                     error_details = response.json().get("detail", "An unknown error occurred.")
                     assistant_response_content = f"❌ **Request Blocked:** {error_details}"
@@ -68,9 +85,9 @@ if st.button("Send", use_container_width=True):
             except requests.exceptions.RequestException as e:
                 assistant_response_content = f"**Error:** Could not connect to the backend. Please ensure it's running. \n\nDetails: {e}"
         
+        # The history loop above draws the new message on the rerun; rendering it here too
+        # would just be thrown away.
         st.session_state.messages.append({"role": "assistant", "content": assistant_response_content})
-        with st.chat_message("assistant"):
-            st.markdown(assistant_response_content, unsafe_allow_html=True)
 
         # Clear input fields by rerunning the script
         st.rerun()
\ No newline at end of file
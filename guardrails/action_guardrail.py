@@ -1,12 +1,87 @@
 # guardrails/action_guardrail.py
 
+import os
+import re
+import sys
 import yaml
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, NamedTuple, Optional, Pattern, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional; without it, rule changes need a restart.
+    Observer = None
 
 # --- Constants ---
 RULES_FILE_PATH = "config/rules.yaml"
 
+# Keys each built-in validator depends on. A rules file where an allowed tool's section is
+# missing one of these (e.g. one truncated mid-write) is rejected rather than applied.
+REQUIRED_TOOL_RULE_KEYS = {
+    "file_reader": ("allowed_paths", "disallowed_extensions"),
+    "database_query": ("forbidden_keywords",),
+}
+
+class _RuleIndex(NamedTuple):
+    """The lookup structures used on every check, built from one rules file."""
+    rules: Dict[str, Any]
+    allowed_tools: frozenset
+    tool_rules: Dict[str, Any]
+    file_disallowed_extensions: Tuple[str, ...]
+    file_allowed_paths: Tuple[str, ...]
+    db_forbidden_re: Optional[Pattern]
+
+# With no rules, no tool is allowed, so every action is blocked.
+_EMPTY_INDEX = _RuleIndex({}, frozenset(), {}, (), (), None)
+
+def _string_list(value: Any, where: str) -> Tuple[str, ...]:
+    """Returns a YAML list of strings as a tuple, raising ValueError if it is anything else."""
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"'{where}' must be a list of strings")
+    return tuple(value)
+
+def _build_rule_index(rules: Dict[str, Any]) -> _RuleIndex:
+    """
+    Validates a parsed rules file and precomputes the lookup structures used on every check,
+    so the hot path doesn't re-walk the raw YAML dictionaries per action.
+    Raises ValueError if a required section or key is missing, or has the wrong type.
+    """
+    if "allowed_tools" not in rules:
+        raise ValueError("'allowed_tools' section is required")
+
+    # Interned names let the membership test settle on an identity check for literal tool names.
+    allowed_tools = frozenset(sys.intern(tool) for tool in _string_list(rules["allowed_tools"], "allowed_tools"))
+
+    # Tools without specific rules don't need a tool_rules section; the check below still
+    # rejects a file whose allowed file_reader or database_query has lost its rules.
+    tool_rules = rules.get("tool_rules") or {}
+    if not isinstance(tool_rules, dict):
+        raise ValueError("'tool_rules' must be a mapping")
+    for tool, section in tool_rules.items():
+        if section is not None and not isinstance(section, dict):
+            raise ValueError(f"'tool_rules.{tool}' must be a mapping")
+    for tool, required_keys in REQUIRED_TOOL_RULE_KEYS.items():
+        section = tool_rules.get(tool) or {}
+        if tool in allowed_tools and any(key not in section for key in required_keys):
+            raise ValueError(f"'tool_rules.{tool}' must define {', '.join(required_keys)}")
+
+    file_rules = tool_rules.get("file_reader") or {}
+    file_disallowed_extensions = _string_list(file_rules.get("disallowed_extensions", []), "file_reader.disallowed_extensions")
+    file_allowed_paths = _string_list(file_rules.get("allowed_paths", []), "file_reader.allowed_paths")
+
+    db_rules = tool_rules.get("database_query") or {}
+    forbidden_keywords = _string_list(db_rules.get("forbidden_keywords", []), "database_query.forbidden_keywords")
+    # One case-insensitive pass over the raw query instead of upper-casing it and scanning per keyword.
+    # No keywords means no pattern; an empty alternation would match every query.
+    db_forbidden_re = None
+    if forbidden_keywords:
+        db_forbidden_re = re.compile(
+            r"\b(?:" + "|".join(map(re.escape, forbidden_keywords)) + r")\b", re.IGNORECASE
+        )
+
+    return _RuleIndex(rules, allowed_tools, tool_rules, file_disallowed_extensions, file_allowed_paths, db_forbidden_re)
+
 class ActionGuardrail:
     """
     A guardrail to validate agent actions against a predefined set of rules.
@@ -16,16 +91,97 @@ class ActionGuardrail:
         Initializes the ActionGuardrail by loading the rules from the YAML file.
         """
         self.logger = logger
+        # Tool-specific validators, looked up by tool name instead of walking an if-chain.
+        self._validators = {
+            "file_reader": self._validate_file_reader,
+            "database_query": self._validate_database_query,
+        }
+        index = self._load_rule_index()
+        if index is None:
+            self.logger.error("CRITICAL: Action guardrail will block all actions.")
+            index = _EMPTY_INDEX # Start with empty rules to prevent crashes
+        # Replaced as a whole on reload, so a check never sees a mix of old and new rules.
+        self._index = index
+
+    @property
+    def rules(self) -> Dict[str, Any]:
+        """The raw rules currently in effect."""
+        return self._index.rules
+
+    def _load_rule_index(self) -> Optional[_RuleIndex]:
+        """
+        Reads, validates and indexes the rules file. Returns None, after logging why, if it can't be used.
+        """
         try:
             with open(RULES_FILE_PATH, 'r') as f:
-                self.rules = yaml.safe_load(f)
-            self.logger.info(f"Successfully loaded action rules from {RULES_FILE_PATH}")
+                rules = yaml.safe_load(f)
         except FileNotFoundError:
-            self.logger.error(f"CRITICAL: Rules file not found at {RULES_FILE_PATH}. Action guardrail will block all actions.")
-            self.rules = {} # Start with empty rules to prevent crashes
+            self.logger.error("CRITICAL: Rules file not found at %s.", RULES_FILE_PATH)
+            return None
         except yaml.YAMLError as e:
-            self.logger.error(f"CRITICAL: Error parsing YAML rules file: {e}. Action guardrail will block all actions.")
-            self.rules = {}
+            self.logger.error("CRITICAL: Error parsing YAML rules file: %s.", e)
+            return None
+        if not isinstance(rules, dict):
+            self.logger.error("CRITICAL: Rules file at %s is empty or malformed.", RULES_FILE_PATH)
+            return None
+        try:
+            index = _build_rule_index(rules)
+        except ValueError as e:
+            self.logger.error("CRITICAL: Rules file at %s is invalid: %s.", RULES_FILE_PATH, e)
+            return None
+        self.logger.info("Successfully loaded action rules from %s", RULES_FILE_PATH)
+        return index
+
+    def reload_rules(self) -> bool:
+        """
+        Re-reads the rules file and swaps in the new rules. If the file can't be used
+        (e.g. it is caught mid-write), the current rules stay in effect.
+
+        Returns:
+            bool: True if the new rules were applied.
+        """
+        index = self._load_rule_index()
+        if index is None:
+            self.logger.error("Keeping the previously loaded action rules.")
+            return False
+        self._index = index
+        return True
+
+    def watch_rules_file(self):
+        """
+        Starts a background watcher that reloads the rules whenever the rules file changes.
+
+        Returns:
+            The running watchdog observer (stop it on shutdown), or None if watchdog isn't installed.
+        """
+        if Observer is None:
+            self.logger.info("watchdog is not installed; action rules will not be hot-reloaded.")
+            return None
+
+        rules_path = os.path.abspath(RULES_FILE_PATH)
+        guardrail = self
+
+        class _RulesFileHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # Only content changes count; open/close events fire when we read the file ourselves.
+                if event.event_type not in ("modified", "created", "moved"):
+                    return
+                changed_paths = {os.path.abspath(event.src_path)}
+                if getattr(event, "dest_path", None):
+                    changed_paths.add(os.path.abspath(event.dest_path))
+                if rules_path in changed_paths:
+                    guardrail.logger.info("Rules file changed; reloading action rules.")
+                    try:
+                        guardrail.reload_rules()
+                    except Exception as e:
+                        # Never let a bad reload kill the watcher thread; the old rules stay in effect.
+                        guardrail.logger.error("Failed to reload action rules: %s", e)
+
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(_RulesFileHandler(), os.path.dirname(rules_path))
+        observer.start()
+        return observer
 
     def is_action_illegal(self, action: Dict[str, Any]) -> bool:
         """
@@ -38,6 +194,8 @@ class ActionGuardrail:
         Returns:
             bool: True if the action is illegal, False otherwise.
         """
+        # Read the rules once, so a reload mid-check can't mix old and new rules.
+        index = self._index
         tool_name = action.get("tool")
         parameters = action.get("parameters", {})
 
@@ -46,33 +204,27 @@ class ActionGuardrail:
             return True
 
         # 1. Check if the tool is in the overall list of allowed tools
-        allowed_tools = self.rules.get("allowed_tools", [])
-        if tool_name not in allowed_tools:
-            self.logger.warning(f"Action blocked: Tool '{tool_name}' is not in the list of allowed tools.")
+        if tool_name not in index.allowed_tools:
+            self.logger.warning("Action blocked: Tool '%s' is not in the list of allowed tools.", tool_name)
             return True
 
         # 2. Check for tool-specific rules
-        tool_rules = self.rules.get("tool_rules", {}).get(tool_name)
+        tool_rules = index.tool_rules.get(tool_name)
         if not tool_rules:
             # If no specific rules exist for this tool, and it was in the allowed list, it's permitted.
-            self.logger.info(f"Action permitted: Tool '{tool_name}' is allowed and has no specific rules.")
+            self.logger.info("Action permitted: Tool '%s' is allowed and has no specific rules.", tool_name)
             return False
 
         # --- Apply specific rules for known tools ---
-
-        # Rule for 'file_reader'
-        if tool_name == "file_reader":
-            return self._validate_file_reader(parameters, tool_rules)
-
-        # Rule for 'database_query'
-        if tool_name == "database_query":
-            return self._validate_database_query(parameters, tool_rules)
+        validator = self._validators.get(tool_name)
+        if validator:
+            return validator(parameters, index)
 
         # If we reach here, the tool is allowed and has passed all its specific checks
-        self.logger.info(f"Action permitted: Tool '{tool_name}' passed all specific rule checks.")
+        self.logger.info("Action permitted: Tool '%s' passed all specific rule checks.", tool_name)
         return False
 
-    def _validate_file_reader(self, parameters: Dict[str, Any], rules: Dict[str, Any]) -> bool:
+    def _validate_file_reader(self, parameters: Dict[str, Any], index: _RuleIndex) -> bool:
         """Validates actions for the 'file_reader' tool."""
         filepath = parameters.get("path")
         if not filepath:
@@ -80,38 +232,35 @@ class ActionGuardrail:
             return True
 
         # Check for disallowed file extensions
-        disallowed_extensions = rules.get("disallowed_extensions", [])
-        if any(filepath.endswith(ext) for ext in disallowed_extensions):
-            self.logger.warning(f"Action 'file_reader' blocked: Access to file with disallowed extension '{filepath}'.")
+        # str.endswith/startswith accept a tuple and test every entry in a single C call.
+        if filepath.endswith(index.file_disallowed_extensions):
+            self.logger.warning("Action 'file_reader' blocked: Access to file with disallowed extension '%s'.", filepath)
             return True
 
         # Check if the path is within an allowed directory
-        allowed_paths = rules.get("allowed_paths", [])
-        if not any(filepath.startswith(p) for p in allowed_paths):
-            self.logger.warning(f"Action 'file_reader' blocked: Path '{filepath}' is not in an allowed directory.")
+        if not filepath.startswith(index.file_allowed_paths):
+            self.logger.warning("Action 'file_reader' blocked: Path '%s' is not in an allowed directory.", filepath)
             return True
 
         return False # Path is valid
 
-    def _validate_database_query(self, parameters: Dict[str, Any], rules: Dict[str, Any]) -> bool:
+    def _validate_database_query(self, parameters: Dict[str, Any], index: _RuleIndex) -> bool:
         """Validates actions for the 'database_query' tool."""
-        query = parameters.get("query", "").upper() # Convert to uppercase for case-insensitive check
+        query = parameters.get("query", "")
         if not query:
             self.logger.warning("Action 'database_query' blocked: Missing 'query' parameter.")
             return True
 
         # Check for forbidden SQL keywords
-        forbidden_keywords = rules.get("forbidden_keywords", [])
-        if any(keyword in query for keyword in forbidden_keywords):
-            self.logger.warning(f"Action 'database_query' blocked: Query contains a forbidden keyword.")
+        if index.db_forbidden_re and index.db_forbidden_re.search(query):
+            self.logger.warning("Action 'database_query' blocked: Query contains a forbidden keyword.")
             return True
 
         return False # Query is valid
 
 # --- Example Usage for direct testing ---
 if __name__ == "__main__":
-    from utils.logger import setup_logger
-    test_logger = setup_logger()
+    from utils.logger import logger as test_logger
 
     guardrail = ActionGuardrail(logger=test_logger)
 
@@ -1,43 +1,118 @@
-import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import time
+from cachetools import TTLCache
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Awaitable, Dict, Optional, Tuple
 
 # --- Import all our custom modules ---
-from utils.logger import logger 
-from guardrails.input_guardrail import is_text_malicious, is_image_malicious
+from utils.logger import logger, quiet_access_log
+from utils.executor import run_in_guard_pool
+from guardrails.input_guardrail import is_text_malicious, is_image_malicious, http_client
 from guardrails.action_guardrail import ActionGuardrail
 
 # --- MODIFICATION: Import the new RouterAgent ---
 from agents.router_agent import RouterAgent
 
+# --- Constants ---
+# Which specialized agent proposes each tool, for reporting in the response.
+TOOL_TO_AGENT = {
+    "web_search": "ResearchAgent",
+    "creative_writing": "CreativeAgent",
+}
+
+# Health probe body, serialized once so probes never touch the JSON encoder.
+HEALTH_BODY = b'{"status":"ok"}'
+
 # --- Application Initialization ---
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Watches config/rules.yaml for the lifetime of the app so rule edits apply without a restart,
+    and closes the shared image-fetch client's pooled connections on shutdown.
+    """
+    rules_watcher = action_guardrail.watch_rules_file() if action_guardrail else None
+    yield
+    if rules_watcher:
+        rules_watcher.stop()
+    await http_client.aclose()
+
 app = FastAPI(
     title="Multi-Agent Guardrails System",
     description="An API that uses a two-stage guardrail system to validate user inputs and agent actions.",
-    version="2.0.0" # Version up!
+    version="2.0.0", # Version up!
+    lifespan=lifespan,
+    # Responses are serialized with orjson instead of the standard-library json encoder.
+    default_response_class=ORJSONResponse,
 )
 
-# Initialize our core components with the shared logger
+# Initialize our core components with the shared logger.
+# They are created once per process and shared by every request.
 try:
     action_guardrail = ActionGuardrail(logger=logger)
     # --- MODIFICATION: Instantiate the RouterAgent instead of MockAgent ---
     router_agent = RouterAgent(logger=logger)
     logger.info("Multi-agent application components initialized successfully.")
 except Exception as e:
-    logger.critical(f"Failed to initialize application components: {e}")
+    logger.critical("Failed to initialize application components: %s", e)
     action_guardrail = None
     # --- MODIFICATION: router_agent instead of mock_agent ---
     router_agent = None
 
 
+# Actions routed for recently seen prompts. Routing is deterministic in the exact prompt
+# (which the action embeds), so a repeated prompt skips the router and its thread hop.
+# Text verdicts are cached separately inside the input guardrail.
+_routing_cache = TTLCache(maxsize=8192, ttl=300)
+
+def _prompt_key(prompt: str) -> bytes:
+    """BLAKE2b-128 digest of a prompt, used as its cache key."""
+    return hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+
+def _elapsed_us(start: float) -> int:
+    """Microseconds elapsed since a time.perf_counter() reading."""
+    return int((time.perf_counter() - start) * 1_000_000)
+
+async def _timed(check: Awaitable, timings: Dict[str, int], name: str):
+    """Awaits a check and records how long it took under timings[name], even if it fails."""
+    started = time.perf_counter()
+    try:
+        return await check
+    finally:
+        timings[name] = _elapsed_us(started)
+
+def _timed_route(prompt: str) -> Tuple[Dict[str, Any], int]:
+    """Routes a prompt and returns the action with the router's own run time, excluding any pool queueing."""
+    started = time.perf_counter()
+    action = router_agent.route(prompt)
+    return action, _elapsed_us(started)
+
+def _start_routing(prompt: str, prompt_key: bytes) -> asyncio.Future:
+    """
+    Returns a future for the prompt's (routed action, routing time in microseconds):
+    already resolved on a cache hit, with a time of 0, otherwise running the router
+    on the guard thread pool.
+    """
+    cached_action = _routing_cache.get(prompt_key)
+    if cached_action is not None:
+        routing = asyncio.get_running_loop().create_future()
+        routing.set_result((cached_action, 0))
+        return routing
+    return run_in_guard_pool(_timed_route, prompt)
+
+
 # --- Pydantic Models for Request and Response ---
 class InvokeRequest(BaseModel):
     prompt: str = Field(..., description="The natural language prompt from the user.")
     image_url: Optional[str] = Field(None, description="An optional URL to an image for analysis.")
 
 class InvokeResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     status: str = Field(description="The final status of the request.")
     routed_to: Optional[str] = Field(None, description="Which specialized agent handled the request.")
     agent_action: Optional[Dict[str, Any]] = Field(None, description="The action the agent was permitted to take.")
@@ -52,46 +127,81 @@ def read_root():
     return {"status": "Multi-Agent Guardrails API is running."}
 
 
+@app.get("/healthz", tags=["Status"])
+async def healthz():
+    """A minimal liveness probe for load balancers and orchestrators."""
+    return Response(content=HEALTH_BODY, media_type="application/json")
+
+# Probes hit these constantly; keep them out of the access log.
+quiet_access_log("/", "/healthz")
+
+
 @app.post("/invoke", response_model=InvokeResponse, tags=["Agent"])
-def invoke_agent(request: InvokeRequest):
+async def invoke_agent(request: InvokeRequest):
     """
     This endpoint processes a user request through the full guardrail system.
+
+    The handler itself logs once per request: a warning if the request is blocked,
+    or a single summary line with per-stage timings if it is approved.
     """
-    logger.info(f"Received new request for prompt: '{request.prompt}'")
-    
+    started = time.perf_counter()
+
     if not action_guardrail or not router_agent:
         raise HTTPException(status_code=503, detail="Service Unavailable: Core components failed to initialize.")
 
-    # === Stage 1: Input Guardrail ===
-    if is_text_malicious(request.prompt, logger):
-        logger.warning(f"Input Guardrail blocked malicious text prompt: '{request.prompt}'")
-        raise HTTPException(status_code=400, detail="Malicious text detected in the prompt.")
+    # Routing depends only on the prompt, so start it now (or take it from the cache) and let
+    # it overlap with the input guardrail's network round-trips. Its result is only used
+    # once Stage 1 has passed.
+    prompt_key = _prompt_key(request.prompt)
+    routing = _start_routing(request.prompt, prompt_key)
 
-    if request.image_url and is_image_malicious(request.image_url, logger):
-        logger.warning(f"Input Guardrail blocked malicious image URL: '{request.image_url}'")
-        raise HTTPException(status_code=400, detail="Malicious image detected at the provided URL.")
-    
-    logger.info("Input Guardrail passed.")
+    # === Stage 1: Input Guardrail ===
+    # The text and image checks are independent network round-trips, so run them concurrently.
+    timings: Dict[str, int] = {}
+    text_check = asyncio.ensure_future(_timed(is_text_malicious(request.prompt, logger), timings, "text"))
+    image_check = asyncio.ensure_future(_timed(is_image_malicious(request.image_url, logger), timings, "image"))
+    try:
+        # Act on each verdict as soon as it arrives, so a blocked request doesn't wait for the slower check.
+        pending = {text_check, image_check}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            if text_check in done and text_check.result():
+                logger.warning("Input Guardrail blocked malicious text prompt (phash=%s): '%s'", prompt_key.hex(), request.prompt)
+                raise HTTPException(status_code=400, detail="Malicious text detected in the prompt.")
+
+            if image_check in done and image_check.result():
+                logger.warning("Input Guardrail blocked malicious image URL (phash=%s): '%s'", prompt_key.hex(), request.image_url)
+                raise HTTPException(status_code=400, detail="Malicious image detected at the provided URL.")
+    except BaseException:
+        # The request is blocked (or failed), so nothing still running for it is needed.
+        for task in (text_check, image_check, routing):
+            task.cancel()
+        raise
+    t_input_us = _elapsed_us(started)
 
     # === Stage 2: Agent Routing and Action Guardrail ===
     # --- MODIFICATION: Use the router to get the proposed action ---
-    proposed_action = router_agent.route(request.prompt)
+    # Routing ran alongside Stage 1, so this usually doesn't wait; its own run time is reported separately.
+    proposed_action, t_route_us = await routing
+    _routing_cache[prompt_key] = proposed_action
     
     # Determine which agent was used for the response
-    tool_used = proposed_action.get("tool")
-    if tool_used == "web_search":
-        agent_name = "ResearchAgent"
-    elif tool_used == "creative_writing":
-        agent_name = "CreativeAgent"
-    else:
-        agent_name = "Unknown"
+    agent_name = TOOL_TO_AGENT.get(proposed_action.get("tool"), "Unknown")
 
     # Check the proposed action against the rules
+    action_check_started = time.perf_counter()
     if action_guardrail.is_action_illegal(proposed_action):
-        logger.warning(f"Action Guardrail blocked illegal action from {agent_name}: {proposed_action}")
+        logger.warning("Action Guardrail blocked illegal action from %s (phash=%s): %r", agent_name, prompt_key.hex(), proposed_action)
         raise HTTPException(status_code=403, detail=f"The proposed agent action '{proposed_action.get('tool')}' is not permitted.")
-        
-    logger.info(f"Action Guardrail passed for action from {agent_name}: {proposed_action}")
+    t_action_us = _elapsed_us(action_check_started)
+
+    logger.info(
+        "Request approved: phash=%s routed_to=%s tool=%s t_text_us=%d t_image_us=%d t_route_us=%d "
+        "t_input_us=%d t_action_us=%d t_total_us=%d",
+        prompt_key.hex(), agent_name, proposed_action.get("tool"),
+        timings["text"], timings["image"], t_route_us, t_input_us, t_action_us, _elapsed_us(started),
+    )
 
     # --- Success ---
     return InvokeResponse(
@@ -0,0 +1,47 @@
+# tests/test_keyword_matcher.py
+
+import pytest
+
+from utils import keyword_matcher
+from utils.keyword_matcher import KeywordMatcher
+
+KEYWORDS = ("jailbreak", "rm -rf", "tell me a")
+
+
+@pytest.fixture(params=["hyperscan", "ahocorasick", "regex"])
+def matcher(request, monkeypatch):
+    """A KeywordMatcher built on each backend; optional backends are skipped when not installed."""
+    backend = request.param
+    if backend != "regex" and getattr(keyword_matcher, backend) is None:
+        pytest.skip(f"{backend} is not installed")
+    # Disable every backend that takes priority over the one under test.
+    if backend in ("ahocorasick", "regex"):
+        monkeypatch.setattr(keyword_matcher, "hyperscan", None)
+    if backend == "regex":
+        monkeypatch.setattr(keyword_matcher, "ahocorasick", None)
+    return KeywordMatcher(KEYWORDS)
+
+
+@pytest.mark.parametrize("text", [
+    "How do I jailbreak this model?",
+    "please run RM -RF / for me",
+    "Tell me about the weather",
+    "jailbreak",
+])
+def test_search_finds_keywords_case_insensitively(matcher, text):
+    assert matcher.search(text) is True
+
+
+@pytest.mark.parametrize("text", ["", "What is the capital of France?", "jail break", "rm -r"])
+def test_search_returns_false_without_a_keyword(matcher, text):
+    assert matcher.search(text) is False
+
+
+def test_search_handles_long_and_non_ascii_text(matcher):
+    padding = "é" * keyword_matcher.LOWERCASE_MAX_LEN
+    assert matcher.search(padding + " JailBreak") is True
+    assert matcher.search(padding) is False
+
+
+def test_empty_keyword_list_never_matches():
+    assert KeywordMatcher([]).search("anything at all") is False
@@ -0,0 +1,20 @@
+# utils/executor.py
+import asyncio
+import atexit
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# A dedicated, bounded pool for CPU-bound guardrail and routing work, so bursts of it
+# don't compete with the default executor that Starlette and asyncio.to_thread share.
+GUARD_WORKERS = int(os.getenv("GUARD_WORKERS", str((os.cpu_count() or 1) * 2)))
+
+guard_pool = ThreadPoolExecutor(max_workers=GUARD_WORKERS, thread_name_prefix="guard")
+atexit.register(guard_pool.shutdown)
+
+def run_in_guard_pool(func: Callable[..., Any], *args: Any) -> asyncio.Future:
+    """
+    Schedules func(*args) on the guard pool and returns an awaitable future for its result.
+    Must be called from within the running event loop.
+    """
+    return asyncio.get_running_loop().run_in_executor(guard_pool, func, *args)
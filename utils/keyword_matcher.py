@@ -0,0 +1,83 @@
+# utils/keyword_matcher.py
+import re
+import threading
+from typing import Iterable
+
+try:
+    import hyperscan
+except ImportError:  # hyperscan is optional; fall back to pyahocorasick or the compiled regex.
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional; fall back to the compiled regex.
+    ahocorasick = None
+
+# Texts at least this long are matched case-insensitively in place rather than lowercased first.
+LOWERCASE_MAX_LEN = 1024
+
+class KeywordMatcher:
+    """
+    Case-insensitive substring matcher for a fixed set of keywords, compiled once up front.
+
+    Uses a Hyperscan database when hyperscan is installed, otherwise an Aho-Corasick
+    automaton for short texts and a single compiled regex for everything else.
+    """
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keyword.lower() for keyword in keywords)
+        self._regex = None
+        self._automaton = None
+        self._hs_db = None
+        if not self.keywords:
+            return
+
+        # Regex over the raw text: no lowercased copy is allocated.
+        self._regex = re.compile("|".join(map(re.escape, self.keywords)), re.IGNORECASE)
+
+        if hyperscan is not None:
+            # All keywords are matched in one SIMD-accelerated pass; scanning stops at the first hit.
+            self._hs_db = hyperscan.Database()
+            self._hs_db.compile(
+                expressions=[re.escape(keyword).encode() for keyword in self.keywords],
+                ids=list(range(len(self.keywords))),
+                elements=len(self.keywords),
+                flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(self.keywords),
+            )
+            # Hyperscan scratch space can't be shared by concurrent scans, so each thread gets its own.
+            self._hs_local = threading.local()
+            return
+
+        # Match all keywords in a single pass over the text when pyahocorasick is available.
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+
+    def search(self, text: str) -> bool:
+        """Returns True if the text contains any of the keywords, ignoring case."""
+        if self._regex is None:
+            return False
+        if self._hs_db is not None:
+            return self._hs_search(text)
+        # Lowercasing a short text for the automaton is cheap; long ones go through the regex
+        # so we never copy a pasted document just to scan it.
+        if self._automaton is not None and len(text) < LOWERCASE_MAX_LEN:
+            return next(self._automaton.iter(text.lower()), None) is not None
+        return self._regex.search(text) is not None
+
+    def _hs_search(self, text: str) -> bool:
+        """Scans the text with the Hyperscan database, stopping at the first match."""
+        scratch = getattr(self._hs_local, "scratch", None)
+        if scratch is None:
+            scratch = self._hs_local.scratch = hyperscan.Scratch(self._hs_db)
+
+        def on_match(match_id, start, end, flags, context):
+            return True  # Returning True halts the scan.
+
+        try:
+            self._hs_db.scan(text.encode("utf-8"), match_event_handler=on_match, scratch=scratch)
+        except hyperscan.ScanTerminated:
+            # A halted scan is reported as an exception rather than a normal return.
+            return True
+        return False
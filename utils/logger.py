@@ -1,27 +1,77 @@
 # utils/logger.py
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import os
+from pathlib import Path
+
+# Logs live next to the project rather than in whatever directory the process started in.
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
 
 def setup_logger():
     """
     Sets up a centralized logger for the application.
+
+    Records are handed to a queue and written to the file and console by a background
+    listener thread, so logging never blocks the request path on disk or terminal I/O.
+
+    Calling it again returns the already configured logger without adding more handlers.
     """
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-
-    # Configure logger
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.FileHandler("logs/guardrails.log"),
-            logging.StreamHandler(sys.stdout) # Also print logs to the console
-        ]
-    )
     logger = logging.getLogger("MultiAgentGuardrail")
+    if logger.handlers:
+        return logger
+
+    # Create logs directory if it doesn't exist (safe if several workers race to create it)
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    # Every uvicorn worker appends to the same file, so none of them may rotate it; a
+    # RotatingFileHandler per process would clobber records on rollover. Rotate the file
+    # externally (e.g. logrotate) instead; this handler reopens it once it has been moved.
+    file_handler = logging.handlers.WatchedFileHandler(LOG_DIR / "guardrails.log")
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler(sys.stdout) # Also print logs to the console
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    listener.start()
+    # Flush whatever is still queued when the process exits.
+    atexit.register(listener.stop)
+
+    # The queue handler only passes the message along; the listener's handlers format it.
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    # Configure our own named logger rather than the root logger, and stop it from
+    # propagating, so records are handled exactly once and third-party library
+    # chatter (e.g. per-request httpx logs) stays out of our handlers.
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(queue_handler)
     return logger
 
+class _AccessPathFilter(logging.Filter):
+    """Drops uvicorn access-log records for a fixed set of request paths."""
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = frozenset(paths)
+
+    def filter(self, record):
+        # uvicorn.access records carry (client_addr, method, path, http_version, status_code) as args.
+        args = record.args
+        return not (isinstance(args, tuple) and len(args) >= 3 and args[2] in self.paths)
+
+def quiet_access_log(*paths):
+    """
+    Stops uvicorn from writing access-log lines for the given paths, e.g. health probes
+    that load balancers hit every few seconds.
+    """
+    logging.getLogger("uvicorn.access").addFilter(_AccessPathFilter(paths))
+
 # Create a single instance of the logger to be imported by other modules
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()